@@ -118,6 +118,8 @@ PRODUCT_CODE = {t: {p: 'TF{}_{}'.format(FRAMESTAMP[t], p.upper())
                     for p in 'rnau'}
                 for t in 'fhd'}
 PRODUCT_TEMPLATE = 'RAD_{code}_{timestamp}.h5'
+# hdf5 product compression, 'lzf' is faster, but only h5py can read it
+HDF5_COMPRESSION = 'gzip'
 NOWCAST_PRODUCT_CODE = 'TF0005_X'
 
 # Delivery times for various products (not a dict, because order matters)
@@ -146,6 +148,7 @@ FTP_PASSWORD = 'MyPassword'
 FTP_RADARS = {}
 # New style mixed source imports
 VOLUME_SOURCES = []
+DOWNLOAD_WORKERS = 4  # concurrent volume file downloads
 # Throughputs of radar related data to client ftp.
 FTP_THROUGH = {}
 
@@ -95,7 +95,7 @@ class Aggregator(object):
         count = np.zeros(gridtools.BaseGrid(dataset).get_shape())
 
         for scandatetime in scandatetimes:
-            logging.debug('adding {}'.format(scandatetime))
+            logging.debug('adding %s', scandatetime)
             composite = gdal.Open(ph.path(scandatetime))
             if composite is None:
                 logging.warn('No composite found for method {} at {}'.format(
@@ -4,23 +4,85 @@
 from openradar import config
 from openradar import scans
 
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime as Datetime
 from datetime import timedelta as Timedelta
-from os.path import abspath, dirname, exists, join
+from functools import lru_cache
+from itertools import repeat
+from os.path import abspath, dirname, join
 
 import logging
 import os
 import shutil
 
 import requests
+from requests.adapters import HTTPAdapter
+
+# one keep-alive connection pool for all volume downloads
+session = requests.Session()
+session.mount('https://', HTTPAdapter(pool_connections=16, pool_maxsize=32))
+session.mount('http://', HTTPAdapter(pool_connections=16, pool_maxsize=32))
+
+CHUNK_SIZE = 1 << 16
+PART_SUFFIX = '.part'
+
+
+def save_response(response, path):
+    """
+    Stream response body to path and return the number of bytes.
+
+    The body is written to a '.part' file that is synced to disk and only
+    then renamed to path, when its size matches the Content-Length header.
+    On a mismatch the partial file is removed and None is returned. If
+    streaming fails, it is removed as well and the exception propagates.
+    """
+    expected = response.headers.get('Content-Length')
+    if expected is None or response.headers.get('Content-Encoding'):
+        expected = None  # iter_content sizes are decoded sizes
+    else:
+        expected = int(expected)
+
+    part_path = path + PART_SUFFIX
+    size = 0
+    try:
+        with open(part_path, 'wb') as f:
+            for chunk in response.iter_content(CHUNK_SIZE):
+                size += len(chunk)
+                if expected is not None and size > expected:
+                    break
+                f.write(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+    except BaseException:
+        os.remove(part_path)  # interrupted mid-stream
+        raise
+
+    if expected is not None and size != expected:
+        logging.warning('Size mismatch for %s: %s bytes, expected %s',
+                        os.path.basename(path), size, expected)
+        os.remove(part_path)
+        return
+
+    os.rename(part_path, path)
+    return size
 
 
 def organize_from_path(path):
     """ Walk basepath and move every scan in there to it's desired location """
     logging.info('Starting organize from {}'.format(path))
+    made_dirs = set()
+
+    # list first, renaming while scanning may show or skip entries
+    with os.scandir(path) as iterator:
+        entries = list(iterator)
 
-    for count, name in enumerate(os.listdir(path), 1):
-        scan_path = abspath(join(path, name))
+    for count, entry in enumerate(entries, 1):
+        if entry.name.endswith(PART_SUFFIX):
+            continue  # still downloading
+        if not any(p.match(entry.name) for p in scans.PATTERNS):
+            logging.debug('Skipping unrecognized file %s', entry.name)
+            continue
+        scan_path = abspath(entry.path)
 
         try:
             scan_signature = scans.ScanSignature(scan_path=scan_path)
@@ -30,10 +92,15 @@ def organize_from_path(path):
             continue
 
         target_path = scan_signature.get_scanpath()
+        target_dir = dirname(target_path)
 
-        if not exists(dirname(target_path)):
-            os.makedirs(dirname(target_path))
-        shutil.move(scan_path, target_path)
+        if target_dir not in made_dirs:
+            os.makedirs(target_dir, exist_ok=True)
+            made_dirs.add(target_dir)
+        try:
+            os.rename(scan_path, target_path)
+        except OSError:
+            shutil.move(scan_path, target_path)  # across filesystems
 
     try:
         logging.info('Processed %s files', count)
@@ -46,7 +113,6 @@ class Dataset:
         "https://api.dataplatform.knmi.nl/open-data/"
         "datasets/{dataset}/versions/{version}/files/"
     )
-    HEADERS = {"Authorization": config.API_KEY}
 
     def __init__(self, dataset, version, step, pattern):
         """Represents a Dataplatform Dataset.
@@ -56,6 +122,7 @@ class Dataset:
             version (str): dataset version
         """
         self.url = self.URL.format(dataset=dataset, version=version)
+        self.headers = {"Authorization": config.API_KEY}
         self.pattern = pattern
 
     def latest(self, count=1):
@@ -64,9 +131,9 @@ class Dataset:
         Args:
             count (int): Number of files in the past to list.
         """
-        response = requests.get(
+        response = session.get(
             self.url,
-            headers=self.HEADERS,
+            headers=self.headers,
             params={"maxKeys": count, "sorting": "desc"},
         )
         result = []
@@ -80,67 +147,129 @@ class Dataset:
     def _get_download_url(self, filename):
         """ Return temporary download url for filename.
         """
-        response = requests.get(
+        response = session.get(
             "{url}/{filename}/url".format(url=self.url, filename=filename),
-            headers=self.HEADERS,
+            headers=self.headers,
         )
         return response.json().get("temporaryDownloadUrl")
 
-    def retrieve(self, filename):
+    def retrieve(self, filename, path):
+        """ Download filename to path, return size or None on failure. """
         url = self._get_download_url(filename)
-        return requests.get(url).content
+        with session.get(url, stream=True) as response:
+            return save_response(response=response, path=path)
+
+
+@lru_cache(maxsize=8192)
+def _get_scan_signature(scan_name):
+    """ Return ScanSignature for scan_name, memoized across fetch rounds. """
+    return scans.ScanSignature(scan_name=scan_name)
+
+
+def get_listing(listings, path):
+    """
+    Return set of names in directory path.
 
+    Listings is a dict that caches the sets by path, so that a directory
+    is read once for a batch of lookups.
+    """
+    if path not in listings:
+        try:
+            listings[path] = set(os.listdir(path))
+        except FileNotFoundError:
+            listings[path] = set()
+    return listings[path]
 
-def get_download_path(scan_name):
+
+def get_download_path(scan_name, listings):
     """Return download path or None.
 
-    None means the scan is already downloaded.
+    None means the scan is already downloaded. Listings is passed to
+    get_listing for the existence checks.
     """
-    download_path = join(config.SOURCE_DIR, scan_name)
-    if exists(download_path):
+    if scan_name in get_listing(listings, config.SOURCE_DIR):
         return
 
-    scan_signature = scans.ScanSignature(scan_name=scan_name)
+    scan_signature = _get_scan_signature(scan_name)
     scan_path = scan_signature.get_scanpath()
-    if exists(scan_path):
+    dir_path, name = os.path.split(scan_path)
+    if name in get_listing(listings, dir_path):
         return
 
-    return download_path
+    return join(config.SOURCE_DIR, scan_name)
 
 
-def fetch_knmi_volume_files(source, count):
+def retrieve_knmi_volume_file(dataset, scan_name, download_path):
+    if dataset.retrieve(scan_name, download_path) is None:
+        return
+    logging.info("Retrieved %s", scan_name)
+
+
+def fetch_knmi_volume_files(source, count, listings):
     dataset = Dataset(**source['platform'])
+    scan_names, download_paths = [], []
     for item in dataset.latest(count):
         scan_name = item["filename"]
-        download_path = get_download_path(scan_name)
+        download_path = get_download_path(scan_name, listings)
         if download_path is None:
             continue
+        scan_names.append(scan_name)
+        download_paths.append(download_path)
 
-        # download
-        content = dataset.retrieve(scan_name)
-        with open(download_path, 'wb') as f:
-            f.write(content)
-        logging.info("Retrieved %s", scan_name)
+    # download, the files are independent so fetch them concurrently
+    with ThreadPoolExecutor(max_workers=config.DOWNLOAD_WORKERS) as executor:
+        list(executor.map(
+            lambda *args: retrieve_knmi_volume_file(dataset, *args),
+            scan_names,
+            download_paths,
+        ))
 
 
-def fetch_dwd_volume_files(source, count, dt_last):
+def retrieve_dwd_volume_file(url, auth, scan_name, download_path):
+    with session.get(url, auth=auth, stream=True) as response:
+        if response.status_code != 200:
+            return
+        size = save_response(response=response, path=download_path)
+    if size is None:
+        return
+    logging.info("Retrieved %s", scan_name)
+
+
+def fetch_dwd_volume_files(source, count, dt_last, listings):
     step = Timedelta(minutes=5)
+    scan_fmt, url_fmt = source['scan'], source['url']
+    urls, scan_names, download_paths = [], [], []
     for stepcount in range(1 - count, 1):
         dt_current = dt_last + step
 
-        scan_name = dt_current.strftime(source['scan'])
-        download_path = get_download_path(scan_name)
+        scan_name = dt_current.strftime(scan_fmt)
+        if scan_name in scan_names:
+            continue  # already queued, the listings are not updated
+        download_path = get_download_path(scan_name, listings)
         if download_path is None:
             continue
-
-        # download
-        url = dt_current.strftime(source['url'])
-        response = requests.get(url, auth=source['auth'])
-        if response.status_code != 200:
-            continue
-        with open(download_path, 'wb') as f:
-            f.write(response.content)
-        logging.info("Retrieved %s", scan_name)
+        urls.append(dt_current.strftime(url_fmt))
+        scan_names.append(scan_name)
+        download_paths.append(download_path)
+
+    # download, the files are independent so fetch them concurrently
+    with ThreadPoolExecutor(max_workers=config.DOWNLOAD_WORKERS) as executor:
+        list(executor.map(
+            retrieve_dwd_volume_file,
+            urls,
+            repeat(source['auth']),
+            scan_names,
+            download_paths,
+        ))
+
+
+def fetch_source_volume_files(source, count, dt_last, listings):
+    if "platform" in source:
+        fetch_knmi_volume_files(source, count=count, listings=listings)
+    else:
+        fetch_dwd_volume_files(
+            source=source, count=count, dt_last=dt_last, listings=listings,
+        )
 
 
 def fetch_volume_files(dt_calculation):
@@ -150,9 +279,17 @@ def fetch_volume_files(dt_calculation):
     dt_last = dt_calculation - Timedelta(minutes=5)
     count = 12
 
-    # Add radars to expected files.
-    for source in config.VOLUME_SOURCES:
-        if "platform" in source:
-            fetch_knmi_volume_files(source, count=count)
-        else:
-            fetch_dwd_volume_files(source=source, count=count, dt_last=dt_last)
+    # directory listings shared by all sources for this round
+    listings = {}
+
+    # Add radars to expected files, the sources are independent.
+    sources = config.VOLUME_SOURCES
+    if not sources:
+        return
+    with ThreadPoolExecutor(max_workers=len(sources)) as executor:
+        list(executor.map(
+            lambda source: fetch_source_volume_files(
+                source=source, count=count, dt_last=dt_last, listings=listings,
+            ),
+            sources,
+        ))
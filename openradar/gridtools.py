@@ -35,12 +35,30 @@ def h5ds2ma(dataset):
     Expects an attribute fillvalue set on dataset.
     """
     fill_value = dataset.attrs['fill_value']
-    array = dataset[:]
+    array = np.empty(dataset.shape, dtype=dataset.dtype)
+    dataset.read_direct(array)
     mask = np.equal(array, fill_value)
     masked_array = np.ma.array(array, mask=mask, fill_value=fill_value)
     return masked_array
 
 
+def h5dss2ma(datasets, fill_value):
+    """
+    Return np masked array stacking datasets along a new first axis.
+
+    Expects datasets of equal shape, each with an attribute fill_value
+    set. Data is read straight into slices of the stacked array.
+    """
+    first = datasets[0]
+    array = np.empty((len(datasets),) + first.shape, dtype=first.dtype)
+    mask = np.empty(array.shape, dtype=bool)
+    for dataset, data, datamask in zip(datasets, array, mask):
+        dataset.read_direct(data)
+        np.equal(data, dataset.attrs['fill_value'], out=datamask)
+    masked_array = np.ma.array(array, mask=mask, fill_value=fill_value)
+    return masked_array
+
+
 def default_normalize(array):
     normalize = colors.Normalize()
     return normalize(array)
@@ -64,10 +64,11 @@ def shape_image_filled():
 def osm_image():
     """ Return rgba image with osm background. """
     ds_osm_rd = gdal.Open(os.path.join(config.MISC_DIR, 'osm-rd.tif'))
-    osm_rgba = np.ones(
+    osm_rgba = np.full(
         (ds_osm_rd.RasterYSize, ds_osm_rd.RasterXSize, 4),
+        255,
         dtype=np.uint8,
-    ) * 255
+    )
     osm_rgba[:, :, 0:3] = ds_osm_rd.ReadAsArray().transpose(1, 2, 0)
     return Image.fromarray(osm_rgba)
 
@@ -75,10 +76,11 @@ def osm_image():
 def mapbox_image():
     """ Return rgba image with mapbox background. """
     ds_mapbox_rd = gdal.Open(os.path.join(config.MISC_DIR, 'mapbox-rd.tif'))
-    mapbox_rgba = np.ones(
+    mapbox_rgba = np.full(
         (ds_mapbox_rd.RasterYSize, ds_mapbox_rd.RasterXSize, 4),
+        255,
         dtype=np.uint8,
-    ) * 255
+    )
     mapbox_rgba[:, :, 0:3] = ds_mapbox_rd.ReadAsArray().transpose(1, 2, 0)
     return Image.fromarray(mapbox_rgba)
 
@@ -86,10 +88,11 @@ def mapbox_image():
 def plain_image(color=(255, 255, 255)):
     """ Return opaque rgba image with color color. """
     basegrid = scans.BASEGRID
-    rgba = np.ones(
+    rgba = np.empty(
         basegrid.get_shape() + (4,),
         dtype=np.uint8,
-    ) * np.uint8(color + (255,))
+    )
+    rgba[:] = color + (255,)
     return Image.fromarray(rgba)
 
 
@@ -250,7 +253,7 @@ def create_png(products, **kwargs):
                 mask = np.equal(array, h5.attrs['fill_value'])
                 img_radars = radars_image(h5=h5, label=label, offset=offset)
         except IOError:
-            logging.debug('Does not exist: {}'.format(product.path))
+            logging.debug('Does not exist: %s', product.path)
             continue
         masked_array = np.ma.array(array, mask=mask)
         img_rain = data_image(masked_array, max_rain=2, threshold=0.008)
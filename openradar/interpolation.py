@@ -65,13 +65,13 @@ class DataLoader(object):
                 with zip_file.open(basename) as csvfile:
                     reader = csv.reader(csvfile)
                     data = [i for i in reader]
-                    logging.debug('Returned {} from zip'.format(basename))
+                    logging.debug('Returned %s from zip', basename)
                     return data
 
         with open(filename) as csvfile:
             reader = csv.reader(csvfile)
             data = [i for i in reader]
-            logging.debug('Returned {} from plaintext'.format(basename))
+            logging.debug('Returned %s from plaintext', basename)
             return data
 
     def processdata(self, skip=None, klasse=1):
@@ -126,15 +126,14 @@ class Interpolator(object):
         Seperates the measurements location and data. Also requests the classes
         of each weather stations. These are now by default set to 1.
         '''
-        xy = numpy.array([[i.lon, i.lat]
-                          for i in self.dataloader.rainstations])
-        z = numpy.array([i.measurement for i in self.dataloader.rainstations])
-        klasse = numpy.array([i.klasse for i in self.dataloader.rainstations])
+        # a single pass over the stations, one array per attribute
+        x, y, z, klasse = map(numpy.array, zip(*[
+            (i.lon, i.lat, i.measurement, i.klasse)
+            for i in self.dataloader.rainstations
+        ]))
         mask = numpy.equal(z, -999.0)
         self.mask = mask
-        z = numpy.ma.array(z, mask=mask)
-        x, y = xy.T[0], xy.T[1]
-        return x[~mask], y[~mask], z.data[~mask], klasse[~mask]
+        return x[~mask], y[~mask], z[~mask], klasse[~mask]
 
     def get_dummies(self):
         '''
@@ -15,13 +15,28 @@ import numpy as np
 # raa00-dx_10488-200608050000-drs---bin
 dwdpattern = re.compile('raa..-(..)[_-]([0-9]{5})-([0-9]*)-(.*?)---bin')
 
+# end of a DX header, possibly with an extra 0x03
+headerend = re.compile(b'\x03+')
+
+# header tokens of DX products, as a lookahead to find overlapping ones too
+dxtokenpattern = re.compile('(?=(BY|VS|CO|CD|CS|EP|MS))')
+
+# known header tokens of radolan composites
+RADOLAN_TOKENS = (
+    'BY', 'VS', 'SW', 'PR', 'INT', 'GP', 'MS', 'LV', 'CS',
+    'MX', 'BG', 'ST', 'VV', 'MF', 'QN', 'VR', 'U',
+)
+
 
 def _get_timestamp_from_filename(filename):
     """Helper function doing the actual work of get_dx_timestamp"""
     time = dwdpattern.search(filename).group(3)
     if len(time) == 10:
         time = '20' + time
-    return Datetime.strptime(time, '%Y%m%d%H%M')
+    if len(time) != 12 or not time.isdigit():
+        raise ValueError('Invalid timestamp {}'.format(time))
+    return Datetime(int(time[0:4]), int(time[4:6]), int(time[6:8]),
+                    int(time[8:10]), int(time[10:12]))
 
 
 def get_dx_timestamp(name):
@@ -47,8 +62,6 @@ def unpack_dx(raw):
     # the zero compression flag is bit 13
     flag = 4096
 
-    beam = []
-
     # # naive version
     # # 49193 function calls in 0.772 CPU seconds
     # # 20234 function calls in 0.581 CPU seconds
@@ -58,37 +71,25 @@ def unpack_dx(raw):
     #     else:
     #         beam.append(item & data)
 
-    # performance version - hopefully
-    # 6204 function calls in 0.149 CPU seconds
+    # performance version - every flagged word expands into as many zeros
+    # as its data part says, every other word is kept once, so the entire
+    # beam is a single np.repeat
 
-    # get all compression cases
-    flagged = np.where(raw & flag)[0]
-
-    # if there is no zero in the whole data, we can return raw as it is
-    if flagged.size == 0:
+    # if there is no zero in the whole data, we can return raw as it is;
+    # or-ing all words together checks this without temporary arrays
+    if not np.bitwise_or.reduce(raw) & flag:
         assert raw.size == 128
         return raw
 
-    # everything until the first flag is normal data
-    beam.extend(raw[0:flagged[0]])
-
-    # iterate over all flags except the last one
-    for this, nxt in zip(flagged[:-1], flagged[1:]):
-        # create as many zeros as there are given within the flagged
-        # byte's data part
-        beam.extend([0] * (raw[this] & data))
-        # append the data until the next flag
-        beam.extend(raw[this + 1:nxt])
-
-    # process the last flag
-    # add zeroes
-    beam.extend([0] * (raw[flagged[-1]] & data))
+    # get all compression cases
+    flagged = (raw & flag) != 0
 
-    # add remaining data
-    beam.extend(raw[flagged[-1] + 1:])
+    counts = np.where(flagged, raw & data, 1)
+    values = np.where(flagged, 0, raw).astype(raw.dtype)
+    beam = np.repeat(values, counts)
 
     # return the data
-    return np.array(beam)
+    return beam
 
 
 def parse_dx_header(header):
@@ -104,29 +105,39 @@ def parse_dx_header(header):
     out = {}
     # RADOLAN product type def
     out["producttype"] = header[0:2]
-    # time stamp from file header as Python datetime object
-    out["datetime"] = Datetime.strptime(
-        header[2:8] + header[13:17] + "00",
-        "%d%H%M%m%y%S"
+    # time stamp from file header as Python datetime object, the header
+    # has ddHHMM at 2:8 and mmyy at 13:17, years as strptime's %y does
+    year = int(header[15:17])
+    out["datetime"] = Datetime(
+        year + (2000 if year < 69 else 1900),
+        int(header[13:15]),
+        int(header[2:4]),
+        int(header[4:6]),
+        int(header[6:8]),
+        tzinfo=timezone.utc,  # Make it aware of its time zone (UTC)
     )
-    # Make it aware of its time zone (UTC)
-    out["datetime"] = out["datetime"].replace(tzinfo=timezone.utc)
     # radar location ID (always 10000 for composites)
     out["radarid"] = header[8:13]
-    pos_by = header.find("BY")
-    pos_vs = header.find("VS")
-    pos_co = header.find("CO")
-    pos_cd = header.find("CD")
-    pos_cs = header.find("CS")
-    pos_ep = header.find("EP")
-    pos_ms = header.find("MS")
+    # first occurrence of every token, found in a single pass
+    positions = {}
+    for match in dxtokenpattern.finditer(header):
+        positions.setdefault(match.group(1), match.start())
+    pos_by = positions.get("BY", -1)
+    pos_vs = positions.get("VS", -1)
+    pos_co = positions.get("CO", -1)
+    pos_cd = positions.get("CD", -1)
+    pos_cs = positions.get("CS", -1)
+    pos_ep = positions.get("EP", -1)
+    pos_ms = positions.get("MS", -1)
 
     out['bytes'] = int(header[pos_by + 2:pos_by + 7])
     out['version'] = header[pos_vs + 2:pos_vs + 4]
     out['cluttermap'] = int(header[pos_co + 2:pos_co + 3])
     out['dopplerfilter'] = int(header[pos_cd + 2:pos_cd + 3])
     out['statfilter'] = int(header[pos_cs + 2:pos_cs + 3])
-    out['elevprofile'] = [float(header[pos_ep + 2 + 3 * i:pos_ep + 2 + 3 * (i + 1)]) for i in range(8)]  # noqa
+    out['elevprofile'] = np.frombuffer(
+        header[pos_ep + 2:pos_ep + 2 + 3 * 8].encode('ascii'), dtype='S3',
+    ).astype(float).tolist()
     out['message'] = header[pos_ms + 5:pos_ms + 5 + int(header[pos_ms + 2:pos_ms + 5])]  # noqa
 
     return out
@@ -148,12 +159,8 @@ def read_dx(filename):
     for this and directly returns the data in the order found in the file.
     If you are in doubt, check the 'azim' attribute.
     Be aware that this function does no extensive checking on its output.
-    If e.g. beams contain different numbers of range bins, the resulting data
-    will not be a 2-D array but a 1-D array of objects, which will most
-    probably break calling code. It was decided to leave the handling of these
-    (hopefully) rare events to the user, who might still be able to retrieve
-    some reasonable data, instead of raising an exception, making it impossible
-    to get any data from a file containing errors.
+    Only if beams contain different numbers of range bins, a ValueError is
+    raised, since the data can not be returned as a 2-D array in that case.
 
     Parameters
     ----------
@@ -191,26 +198,27 @@ def read_dx(filename):
 
     azimuthbitmask = 2 ** (14 - 1)
     databitmask = 2 ** (13 - 1) - 1
+    zeroflag = 2 ** (13 - 1)
     clutterflag = 2 ** 15
     dataflag = 2 ** 13 - 1
 
     f = open(filename, 'rb')
 
-    # header string for later processing
-    header = ''
-    atend = False
-
-    # read header
+    # read header in blocks
+    buf = b''
     while True:
-        mychar = f.read(1)
+        block = f.read(512)
+        buf += block
         # 0x03 signals the end of the header but sometimes there might be
         # an additional 0x03 char after that
-
-        if mychar == b'\x03':
-            atend = True
-        if mychar != b'\x03' and atend:
+        atend = headerend.search(buf)
+        if atend and (atend.end() < len(buf) or not block):
             break
-        header += str(mychar.decode())
+        if not block:
+            raise ValueError('No end of header found in {}'.format(filename))
+
+    # header string for later processing
+    header = buf[:atend.end()].decode()
 
     attrs = parse_dx_header(header)
 
@@ -242,35 +250,46 @@ def read_dx(filename):
     # the indices we have to retrieve element 0 of this tuple
     newazimuths = np.where(raw == azimuthbitmask)[0]  # Thomas kontaktieren!
 
-    # for the following calculations it is necessary to have the end of the
-    # data as the last index
-    newazimuths = np.append(newazimuths, len(raw))
-
-    # initialize our list of rays/beams
-    beams = []
-    # initialize our list of elevations
-    elevs = []
-    # initialize our list of azimuths
-    azims = []
-
-    # iterate over all beams
-    for i in range(newazimuths.size - 1):
-        # unpack zeros
-        beam = unpack_dx(raw[newazimuths[i] + 3:newazimuths[i + 1]])
-        beams.append(beam)
-        elevs.append((raw[newazimuths[i] + 2] & databitmask) / 10.)
-        azims.append((raw[newazimuths[i] + 1] & databitmask) / 10.)
-
-    beams = np.array(beams)
+    # the three words starting a beam hold the flag, azimuth and elevation
+    elevs = (raw[newazimuths + 2] & databitmask) / 10.
+    azims = (raw[newazimuths + 1] & databitmask) / 10.
+
+    # decompress all beams at once, see unpack_dx: a flagged word expands
+    # into zeros, other data words are kept once and beam header words
+    # are dropped, as is anything before the first beam
+    flagged = (raw & zeroflag) != 0
+    counts = np.where(flagged, raw & databitmask, 1)
+    counts[:newazimuths[0] if newazimuths.size else len(raw)] = 0
+    beam_header = (newazimuths.reshape(-1, 1) + np.arange(3)).ravel()
+    counts[beam_header[beam_header < len(raw)]] = 0
+    values = np.where(flagged, 0, raw).astype(raw.dtype)
+    unpacked = np.repeat(values, counts)
+
+    # split into beams, these normally all have the same number of bins
+    if newazimuths.size == 0:
+        beams = np.array([])
+    else:
+        lengths = np.add.reduceat(counts, newazimuths)
+        if (lengths != lengths[0]).any():
+            raise ValueError(
+                'Beams in {} differ in number of range bins: {}'.format(
+                    filename, sorted(set(lengths.tolist())),
+                ),
+            )
+        beams = unpacked.reshape(lengths.size, lengths[0])
 
     # attrs =  {}
-    attrs['elev'] = np.array(elevs)
-    attrs['azim'] = np.array(azims)
-    attrs['clutter'] = (beams & clutterflag) != 0
+    attrs['elev'] = elevs
+    attrs['azim'] = azims
+    bits = np.bitwise_and(beams, clutterflag)
+    attrs['clutter'] = np.not_equal(bits, 0)
 
     # converting the DWD rvp6-format into dBZ data and return as numpy array
-    # together with attributes
-    return (beams & dataflag) * 0.5 - 32.5, attrs
+    # together with attributes, reusing the buffers where possible
+    np.bitwise_and(beams, dataflag, out=bits)
+    dbz = np.multiply(bits, 0.5)
+    np.subtract(dbz, 32.5, out=dbz)
+    return dbz, attrs
 
 
 def get_radolan_header_token():
@@ -281,12 +300,11 @@ def get_radolan_header_token():
     head : dict
         with known header token, value set to None
     """
-    head = {'BY': None, 'VS': None, 'SW': None, 'PR': None,
-            'INT': None, 'GP': None, 'MS': None, 'LV': None,
-            'CS': None, 'MX': None, 'BG': None, 'ST': None,
-            'VV': None, 'MF': None, 'QN': None, 'VR': None,
-            'U': None}
-    return head
+    return dict.fromkeys(RADOLAN_TOKENS)
+
+
+# lookahead, so that overlapping tokens are all found, like with rfind
+tokenpattern = re.compile('(?=({}))'.format('|'.join(RADOLAN_TOKENS)))
 
 
 def get_radolan_header_token_pos(header):
@@ -305,23 +323,19 @@ def get_radolan_header_token_pos(header):
 
     head_dict = get_radolan_header_token()
 
-    for token in head_dict.keys():
-        d = header.rfind(token)
-        if d > -1:
-            head_dict[token] = d
-    head = {}
+    # the last occurrence of every token, found in a single pass
+    for match in tokenpattern.finditer(header):
+        head_dict[match.group(1)] = match.start()
+
+    # a token's value stops where the next token starts, positions are
+    # unique because no two tokens can start at the same place
+    positions = sorted(v for v in head_dict.values() if v is not None)
+    stops = dict(zip(positions, positions[1:] + [len(header)]))
 
-    result_dict = {}
-    result_dict.update((k, v) for k, v in head_dict.items() if v is not None)
+    head = {}
     for k, v in head_dict.items():
         if v is not None:
-            start = v + len(k)
-            filt = [x for x in result_dict.values() if x > v]
-            if filt:
-                stop = min(filt)
-            else:
-                stop = len(header)
-            head[k] = (start, stop)
+            head[k] = (v + len(k), stops[v])
         else:
             head[k] = v
 
@@ -390,8 +404,8 @@ def parse_dwd_composite_header(header):
                 out["ncol"] = int(dimstrings[1])
             if k == 'LV':
                 lv = header[v[0]:v[1]].split()
-                out['nlevel'] = np.int(lv[0])
-                out['level'] = np.array(lv[1:]).astype('float')
+                out['nlevel'] = int(lv[0])
+                out['level'] = np.array(lv[1:], dtype=float)
             if k == 'MS':
                 locationstring = (header[v[0]:].strip().split("<")[1].
                                   split(">")[0])
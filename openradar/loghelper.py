@@ -49,17 +49,27 @@ def _get_logging_dict(logfile_path):
     }
 
 
+# logfile path of the current configuration
+_configured_path = None
+
+
 def setup_logging(logfile_name='radar.log'):
-    """ Setup logging according to logfile and settings. """
+    """
+    Setup logging according to logfile and settings.
+
+    Does nothing when logging already goes to that logfile, so that worker
+    processes running the same task over and over do not reopen it.
+    """
+    global _configured_path
     # Get logging dictionary
     logfile_path = os.path.join(config.LOG_DIR, logfile_name)
+    if logfile_path == _configured_path:
+        return
     logging_dict = _get_logging_dict(logfile_path=logfile_path)
     # Create directory if necessary
-    try:
-        os.makedirs(os.path.dirname(
-            logging_dict['handlers']['file']['filename'],
-        ))
-    except OSError:
-        pass  # Already exists
+    os.makedirs(os.path.dirname(
+        logging_dict['handlers']['file']['filename'],
+    ), exist_ok=True)
     # Config logging
     logging.config.dictConfig(logging_dict)
+    _configured_path = logfile_path
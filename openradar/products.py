@@ -1,17 +1,48 @@
 # -*- coding: utf-8 -*-
 # (c) Nelen & Schuurmans.  GPL licensed, see LICENSE.rst.
 
+from functools import lru_cache
+
 import h5py
 import logging
 import numpy as np
 import os
-import shutil
 
 from openradar import config
 from openradar import utils
 from openradar import scans
 from openradar.interpolation import DataLoader, Interpolator
 
+GRID_SHAPE = scans.BASEGRID.get_shape()
+
+
+@lru_cache(maxsize=4096)
+def get_product_path(basedir, code, template, datetime):
+    """
+    Return product path.
+
+    Memoized, because the consistifier creates the same products over and
+    over when it recurses.
+    """
+    return utils.PathHelper(
+        basedir=basedir,
+        code=code,
+        template=template,
+    ).path(datetime)
+
+
+def read_precipitation(h5):
+    """
+    Return precipitation of opened product h5 as masked array.
+
+    The dataset is read once, straight into the array, and the mask is
+    derived from that array instead of from the dataset.
+    """
+    dataset = h5['precipitation']
+    array = np.empty(dataset.shape, dtype=dataset.dtype)
+    dataset.read_direct(array)
+    return np.ma.array(array, mask=np.equal(array, config.NODATAVALUE))
+
 
 class CopiedProduct(object):
     """ Represents a copy of an aggregate. """
@@ -21,11 +52,12 @@ class CopiedProduct(object):
 
         # determine product paths
         code = config.NOWCAST_PRODUCT_CODE
-        self.path = utils.PathHelper(
+        self.path = get_product_path(
             basedir=config.NOWCAST_CALIBRATE_DIR,
             code=code,
             template=config.PRODUCT_TEMPLATE,
-        ).path(datetime)
+            datetime=datetime,
+        )
         self.ftp_path = os.path.join(code, os.path.basename(self.path))
 
     def get(self):
@@ -47,12 +79,8 @@ class CopiedProduct(object):
         if not os.path.exists(source_path):
             return
 
-        try:
-            os.makedirs(os.path.dirname(self.path))
-        except Exception:
-            pass
-
-        shutil.copy(source_path, self.path)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        utils.copy_file(source_path, self.path)
         logging.info('Create CopiedProduct {}'.format(
             os.path.basename(self.path)
         ))
@@ -88,11 +116,12 @@ class CalibratedProduct(object):
 
         # determine product paths
         code = config.PRODUCT_CODE[self.timeframe][self.prodcode]
-        self.path = utils.PathHelper(
+        self.path = get_product_path(
             basedir=config.CALIBRATE_DIR,
             code=code,
             template=config.PRODUCT_TEMPLATE,
-        ).path(datetime)
+            datetime=datetime,
+        )
         self.ftp_path = os.path.join(code, os.path.basename(self.path))
 
     def _get_aggregate(self):
@@ -105,9 +134,23 @@ class CalibratedProduct(object):
                                multiscandir=config.MULTISCAN_DIR,
                                grid=scans.BASEGRID)
 
+    def _is_fresh(self, aggregate_path):
+        """ Return if product exists and is not older than aggregate. """
+        try:
+            product_mtime = os.path.getmtime(self.path)
+            aggregate_mtime = os.path.getmtime(aggregate_path)
+        except OSError:
+            return False
+        return product_mtime >= aggregate_mtime
+
     def make(self):
         aggregate = self._get_aggregate()
         aggregate.make()
+        if self._is_fresh(aggregate.get_path()):
+            logging.info('Reuse CalibratedProduct {}'.format(
+                os.path.basename(self.path)
+            ))
+            return
         metafile = os.path.join(config.MISC_DIR, 'grondstations.csv')
         stations_count = 0
         cal_station_ids = []
@@ -137,15 +180,22 @@ class CalibratedProduct(object):
             cal_method=calibration_method,
         ))
 
-        calibrated_ma = np.ma.masked_equal(
+        # plain numpy for the clipping, the masked array only wraps it
+        nodata = np.equal(calibrated_radar, config.NODATAVALUE)
+        calibrated_ma = np.ma.array(
             calibrated_radar,
-            config.NODATAVALUE,
+            mask=nodata,
+            fill_value=config.NODATAVALUE,
         )
 
-        logging.debug('Setting negative values to 0. Min was: {}'.format(
-            calibrated_ma.min()),
-        )
-        calibrated_ma.data[np.ma.less(calibrated_ma, 0)] = 0
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            logging.debug(
+                'Setting negative values to 0. Min was: %s',
+                calibrated_ma.min(),
+            )
+        negative = np.less(calibrated_radar, 0)
+        negative &= ~nodata
+        calibrated_radar[negative] = 0
 
         utils.save_dataset(path=self.path,
                            meta=self.metadata,
@@ -194,13 +244,17 @@ class ConsistentProduct(object):
 
         # determine product paths
         code = config.PRODUCT_CODE[self.timeframe][self.prodcode]
-        self.path = utils.PathHelper(
+        self.path = get_product_path(
             basedir=config.CONSISTENT_DIR,
             code=code,
             template=config.PRODUCT_TEMPLATE,
-        ).path(datetime)
+            datetime=datetime,
+        )
         self.ftp_path = os.path.join(code, os.path.basename(self.path))
 
+        # set by create_from_array while the consistifier may still need it
+        self.precipitation = None
+
     def get(self):
         """
         Return h5 dataset opened in read mode.
@@ -217,6 +271,27 @@ class ConsistentProduct(object):
         Creates a ConsistentProduct from product with data multiplied
         by factor and adds consistent_with to the metadata.
         """
+        with product.get() as h5:
+            precipitation = read_precipitation(h5)
+            meta = dict(h5.attrs)
+
+        return cls.create_from_array(
+            product=product,
+            precipitation=precipitation,
+            meta=meta,
+            factor=factor,
+            consistent_with=consistent_with,
+        )
+
+    @classmethod
+    def create_from_array(cls, product, precipitation, meta,
+                          factor, consistent_with):
+        """
+        Return ConsistentProduct.
+
+        Like create, but with the precipitation and metadata of product
+        already read by the caller.
+        """
         # Create the consistent product object
         consistent_product = cls(
             datetime=product.datetime,
@@ -224,13 +299,13 @@ class ConsistentProduct(object):
             timeframe=product.timeframe,
         )
 
-        # Create the h5 datafile for it
-        with product.get() as h5:
-            data = h5['precipitation']
-            mask = np.equal(data, config.NODATAVALUE)
-            data = dict(precipitation=np.ma.array(data, mask=mask) * factor)
-            meta = dict(h5.attrs)
-            meta.update(consistent_with=consistent_with)
+        # Create the h5 datafile for it, multiplying the plain data and
+        # reusing the mask, instead of doing masked arithmetic
+        data = dict(precipitation=np.ma.array(
+            np.multiply(precipitation.data, factor),
+            mask=precipitation.mask,
+        ))
+        meta = dict(meta, consistent_with=consistent_with)
 
         utils.convert_to_lists_and_unicode(meta)
 
@@ -241,6 +316,7 @@ class ConsistentProduct(object):
         )
 
         # get() will now work, so return the object.
+        consistent_product.precipitation = data['precipitation']
         filepath = consistent_product.path
         filename = os.path.basename(filepath)
         logging.info('Created ConsistentProduct {}'.format(filename))
@@ -303,44 +379,66 @@ class Consistifier(object):
                                     timeframe=sub_timeframe)
 
     @classmethod
-    def _precipitation_from_product(cls, product):
-        """ Return precipitation as masked array. """
+    def _contents_from_product(cls, product):
+        """ Return precipitation as masked array and metadata dict. """
         with product.get() as h5:
-            data = h5['precipitation']
-            mask = np.equal(data, config.NODATAVALUE)
-            precipitation = np.ma.array(data, mask=mask)
-        return precipitation
+            precipitation = read_precipitation(h5)
+            meta = dict(h5.attrs)
+        return precipitation, meta
+
+    @classmethod
+    def _precipitation_from_product(cls, product):
+        """
+        Return precipitation as masked array.
+
+        Freshly created consistent products still carry it in memory.
+        """
+        precipitation = getattr(product, 'precipitation', None)
+        if precipitation is not None:
+            return precipitation
+        return cls._contents_from_product(product)[0]
 
     @classmethod
     def create_consistent_products(cls, product):
         """ Returns a list of consistent products that were created. """
         consistified_products = []
         if cls._reliable(product):
+            # Sum and factor in one float32 buffer, like the stored data
+            buffers = np.empty((2,) + GRID_SHAPE, dtype=np.float32)
+            subproduct_sum, factor = buffers
+
             # Calculate sum of subproducts
-            subproduct_sum = np.zeros(scans.BASEGRID.get_shape())
+            # Keep the contents, so that each subproduct is read only once
+            subproduct_sum.fill(0)
+            subproduct_contents = []
             for subproduct in cls._subproducts(product):
-                spp = cls._precipitation_from_product(subproduct).filled(0)
+                precipitation, meta = cls._contents_from_product(subproduct)
+                subproduct_contents.append((subproduct, precipitation, meta))
+                spp = precipitation.filled(0)
 
                 # in the past kriging sometimes resulted in NaN values
-                if np.isnan(spp).any():
+                nans = np.isnan(spp)
+                if nans.any():
                     logging.warning(
                         "Zeroing NaNs in %s", subproduct.path,
                     )
-                    spp[np.isnan(spp)] = 0
+                    spp[nans] = 0
 
                 subproduct_sum += spp
 
             # Calculate factor
-            factor = np.ones(scans.BASEGRID.get_shape())
+            factor.fill(1)
             pp = cls._precipitation_from_product(product).filled(0)
             index = subproduct_sum > 0
-            factor[index] = pp[index] / subproduct_sum[index]
+            np.divide(pp, subproduct_sum, out=factor, where=index)
 
             # Create consistent products
-            for subproduct in cls._subproducts(product):
+            for subproduct, precipitation, meta in subproduct_contents:
                 consistified_products.append(
-                    ConsistentProduct.create(
+                    ConsistentProduct.create_from_array(
                         product=subproduct,
+                        precipitation=precipitation,
+                        meta=meta,
                         factor=factor,
                         consistent_with=os.path.basename(product.path)
                     )
@@ -353,6 +451,7 @@ class Consistifier(object):
                 more_consistified_products.extend(
                     cls.create_consistent_products(consistified_product)
                 )
+                consistified_product.precipitation = None  # free memory
             consistified_products.extend(more_consistified_products)
         return consistified_products
 
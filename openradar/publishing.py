@@ -24,14 +24,14 @@ class FtpPublisher(object):
                               config.FTP_USER,
                               config.FTP_PASSWORD)
         # Create directories when necessary
-        ftp_paths = self.ftp.nlst()
+        ftp_paths = set(self.ftp.nlst())
         for path in [path
                      for d in config.PRODUCT_CODE.values()
                      for path in d.values()] + [config.NOWCAST_PRODUCT_CODE]:
             if path not in ftp_paths:
                 self.ftp.mkd(path)
 
-        # Set empty dictionary for nlst caching
+        # Set empty dictionary for nlst caching, listings are sets
         self._nlst = {}
         return self
 
@@ -39,6 +39,18 @@ class FtpPublisher(object):
         """ Close ftp connection. """
         self.ftp.quit()
 
+    def _store(self, ftp_file, product_file):
+        """
+        Store file like storbinary does, but let the kernel send it.
+
+        Socket.sendfile falls back to plain sends where os.sendfile is
+        not available.
+        """
+        self.ftp.voidcmd('TYPE I')
+        with self.ftp.transfercmd('STOR {}'.format(ftp_file)) as conn:
+            conn.sendfile(product_file)
+        return self.ftp.voidresp()
+
     def publish(self, product, overwrite=True):
         """ Publish the product in the correct folder. """
         ftp_file = product.ftp_path
@@ -50,16 +62,13 @@ class FtpPublisher(object):
                 return
             dirname = os.path.dirname(ftp_file)
             if dirname not in self._nlst:
-                self._nlst[dirname] = self.ftp.nlst(dirname)
+                self._nlst[dirname] = set(self.ftp.nlst(dirname))
             if ftp_file in self._nlst[dirname]:
                 logging.debug('FTP file already exists, skipping.')
                 return
 
         with open(product.path, 'rb') as product_file:
-            response = self.ftp.storbinary(
-                'STOR {}'.format(ftp_file),
-                product_file,
-            )
+            response = self._store(ftp_file, product_file)
 
         logging.debug('ftp response: {}'.format(response))
         logging.info(
@@ -81,7 +90,14 @@ class Publisher(object):
         self.nowcast = nowcast
 
     def ftp_publications(self, cascade=False):
-        """ Return product generator. """
+        """
+        Return product generator.
+
+        Only nowcast products are published to ftp from now on, so
+        nothing is generated when not publishing nowcast.
+        """
+        if not self.nowcast:
+            return
         if isinstance(self.datetimes, (list, tuple)):
             datetimes = self.datetimes
         else:
@@ -93,30 +109,8 @@ class Publisher(object):
             timeframes=self.timeframes,
         )
         for combination in combinations:
-            if combination.pop('nowcast') and self.nowcast:
+            if combination['nowcast']:
                 yield products.CopiedProduct(datetime=combination['datetime'])
-            # ignore the rest, only publish to ftp for nowcast from now on
-            continue
-
-            nowcast = combination.pop('nowcast')
-            if nowcast != self.nowcast:
-                continue
-
-            if nowcast:
-                yield products.CopiedProduct(datetime=combination['datetime'])
-                continue
-
-            consistent = utils.consistent_product_expected(
-                prodcode=combination['prodcode'],
-                timeframe=combination['timeframe'],
-            )
-            product = products.CalibratedProduct(**combination)
-            if not consistent:
-                yield product
-            if cascade:
-                rps = products.Consistifier.get_rescaled_products(product)
-                for rescaled_product in rps:
-                    yield rescaled_product
 
     def publications(self, cascade=False):
         for publication in self.ftp_publications(cascade=cascade):
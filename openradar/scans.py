@@ -84,6 +84,9 @@ class ScanSignature(object):
         """
         Init with scan_path, scan_name, or (code, datetime) scan_tuple.
         """
+        self._scanname = None
+        self._scanpath = None
+
         if scan_tuple:
             radar_code, scan_datetime = scan_tuple
             radar_id = config.RADAR_ID.get(radar_code, '')
@@ -190,19 +193,24 @@ class ScanSignature(object):
         raise ValueError("There is no format for {}".format(radar_dict))
 
     def get_scanname(self):
-        radar_dict = {'code': self._code, 'id': self._id}
-        fmt = self._get_datetime_name(radar_dict)
-        return self._datetime.strftime(fmt)
+        # a signature does not change, so the name is formatted only once
+        if self._scanname is None:
+            radar_dict = {'code': self._code, 'id': self._id}
+            fmt = self._get_datetime_name(radar_dict)
+            self._scanname = self._datetime.strftime(fmt)
+        return self._scanname
 
     def get_scanpath(self):
-        return os.path.join(
-            config.RADAR_DIR,
-            self._code,
-            self._datetime.strftime('%Y'),
-            self._datetime.strftime('%m'),
-            self._datetime.strftime('%d'),
-            self.get_scanname(),
-        )
+        if self._scanpath is None:
+            self._scanpath = os.path.join(
+                config.RADAR_DIR,
+                self._code,
+                self._datetime.strftime('%Y'),
+                self._datetime.strftime('%m'),
+                self._datetime.strftime('%d'),
+                self.get_scanname(),
+            )
+        return self._scanpath
 
     def get_datetime(self):
         return self._datetime
@@ -430,7 +438,7 @@ class ScanKNMI(GenericScan):
             azim_step,
         ).reshape(-1, 1)
 
-        elev = dataset.attrs['scan_elevation'] * np.ones(azim.shape)
+        elev = np.full(azim.shape, dataset.attrs['scan_elevation'])
         return rang, azim, elev
 
 
@@ -585,7 +593,7 @@ class MultiScan(object):
                     continue  # This will be used as the name of the dataset.
                 target_band.attrs[k] = v
 
-        logging.debug('{} added to multiscan.'.format(radar))
+        logging.debug('%s added to multiscan.', radar)
 
     def get(self):
         """
@@ -604,7 +612,7 @@ class MultiScan(object):
 
         if len(dataset):
             logging.debug(
-                'Multiscan file already has {}.'.format(', '.join(dataset))
+                'Multiscan file already has %s.', ', '.join(dataset),
             )
         else:
             logging.debug('Starting with empty multiscan file.')
@@ -666,10 +674,12 @@ class Composite(object):
         window_lower = window_upper + height
         return window_left, window_right, window_upper, window_lower
 
-    def _calculate(self, datasets):
+    def _calculate(self, datasets, metadata):
         """
         Return a composite dataset based on the
         weighted lowest altitudes method.
+
+        Metadata is the list of attribute dicts belonging to datasets.
         """
         if not datasets:
             return np.ma.array(
@@ -679,26 +689,24 @@ class Composite(object):
             )
 
         # Read datasets
-        metadata = [dict(ds.attrs) for ds in datasets]
-
         stations = [m['station'] for m in metadata]
 
         anth = np.array(
             [json.loads(m['antenna_height']) for m in metadata],
         ).reshape((-1, 1, 1)) / 1000
 
-        rain = np.ma.array(
-            [gridtools.h5ds2ma(ds['rain']) for ds in datasets],
+        rain = gridtools.h5dss2ma(
+            [ds['rain'] for ds in datasets],
             fill_value=config.NODATAVALUE,
         )
 
-        rang = np.ma.array(
-            [gridtools.h5ds2ma(ds['range']) for ds in datasets],
+        rang = gridtools.h5dss2ma(
+            [ds['range'] for ds in datasets],
             fill_value=config.NODATAVALUE,
         )
 
-        elev = np.ma.array(
-            [gridtools.h5ds2ma(ds['elevation']) for ds in datasets],
+        elev = gridtools.h5dss2ma(
+            [ds['elevation'] for ds in datasets],
             fill_value=config.NODATAVALUE,
         )
 
@@ -744,7 +752,7 @@ class Composite(object):
                 if not count:
                     break
                 logging.debug(
-                    'Masking {} historically suspicious pixels'.format(count),
+                    'Masking %s historically suspicious pixels', count,
                 )
                 rain.mask[extra] = True
 
@@ -786,13 +794,12 @@ class Composite(object):
 
         return composite
 
-    def _metadata(self, radars, datasets):
+    def _metadata(self, radars, metadatas):
         """ Return metadata dict. """
         requested_stations = json.dumps(self.scancodes)
         timestamp = self.multiscan.multiscandatetime.strftime(
             config.TIMESTAMP_FORMAT,
         )
-        metadatas = [dict(ds.attrs) for ds in datasets]
         stations = json.dumps(radars)
         locations = json.dumps([json.loads(metadata['location'])
                                 for metadata in metadatas])
@@ -850,8 +857,10 @@ class Composite(object):
             pass
             # return None
 
-        ma = self._calculate(datasets)
-        md = self._metadata(radars=radars, datasets=datasets)
+        # attributes are read once and shared by both steps
+        metadatas = [dict(ds.attrs) for ds in datasets]
+        ma = self._calculate(datasets=datasets, metadata=metadatas)
+        md = self._metadata(radars=radars, metadatas=metadatas)
 
         multiscan_dataset.close()
 
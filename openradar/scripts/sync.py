@@ -10,13 +10,15 @@ import ftplib
 import os
 import io
 
+BLOCKSIZE = 1 << 20
+
 
 def ftp_transfer(source, target, name):
     """ Transfer ftp file from source ftp to target ftp. """
     data = io.BytesIO()
-    source.retrbinary('RETR ' + name, data.write)
+    source.retrbinary('RETR ' + name, data.write, blocksize=BLOCKSIZE)
     data.seek(0)
-    target.storbinary('STOR ' + name, data)
+    target.storbinary('STOR ' + name, data, blocksize=BLOCKSIZE)
 
 
 def ftp_sync(source, target):
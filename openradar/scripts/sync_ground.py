@@ -4,19 +4,22 @@
 Sync groundstations to a flat mirror and place new files atomically in an
 import directory.
 """
+from concurrent.futures import ThreadPoolExecutor
+from html.parser import HTMLParser
 from os.path import basename, join
 from urllib.parse import urljoin
 
 import argparse
 import logging
 import os
-import re
 import shutil
 import sys
 
 import requests
+from requests.adapters import HTTPAdapter
 
 from openradar import config
+from openradar import files
 
 logger = logging.getLogger(__name__)
 
@@ -31,32 +34,81 @@ URL = config.SYNC_GROUND['url']
 USER = config.SYNC_GROUND['user']
 PASSWORD = config.SYNC_GROUND['password']
 
-# link pattern
-PATTERN = re.compile('<a href="(.*)">.*</a>')
+# concurrent downloads, sharing keep-alive connections
+WORKERS = 16
+session = requests.Session()
+session.mount('http://', HTTPAdapter(pool_maxsize=WORKERS))
+session.mount('https://', HTTPAdapter(pool_maxsize=WORKERS))
+
+
+class LinkParser(HTMLParser):
+    """ Collect the href values of the anchors in a page. """
+    def __init__(self):
+        super().__init__()
+        self.links = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'a':
+            href = dict(attrs).get('href')
+            if href:
+                self.links.append(href)
 
 
 def get_child_urls(url, auth):
     """
     Return the value of the links.
     """
-    text = requests.get(url, auth=auth).text
-    for line in text.split('\n'):
-        match = PATTERN.search(line)
-        if not match:
-            continue
-        link = match.groups()[0]
+    parser = LinkParser()
+    parser.feed(session.get(url, auth=auth).text)
+    parser.close()
+    for link in parser.links:
         if link != '../':
             yield urljoin(url, link)
 
 
 def download(url, path, auth):
     """
-    Download url to path.
+    Download url to path, return True if it succeeded.
+
+    The body is streamed to a '.part' file that is only renamed to path
+    when it is complete, so that an interrupted download never ends up
+    in the mirror under its real name.
     """
-    response = requests.get(url, auth=auth)
-    if response.status_code == 200:
-        with open(path, 'wb') as f:
-            f.write(response.content)
+    try:
+        with session.get(url, auth=auth, stream=True) as response:
+            if response.status_code != 200:
+                return False
+            size = files.save_response(response=response, path=path)
+    except requests.RequestException:
+        return False
+    return size is not None
+
+
+def retrieve(url, filename, auth):
+    """
+    Download url to the mirror and link-and-move it to import.
+
+    The import file is a hard link to the mirror file where the filesystem
+    allows it, and a copy otherwise.
+    """
+    suffix = '.copy'
+    if not download(url=url, path=join(MIRROR_DIR, filename), auth=auth):
+        logger.warning('Could not download %s.', filename)
+        return
+    try:
+        os.link(
+            join(MIRROR_DIR, filename),
+            join(MIRROR_DIR, filename + suffix),
+        )
+    except OSError:  # hard links not supported
+        shutil.copy(
+            join(MIRROR_DIR, filename),
+            join(MIRROR_DIR, filename + suffix),
+        )
+    os.rename(
+        join(MIRROR_DIR, filename + suffix),
+        join(IMPORT_DIR, filename),
+    )
 
 
 def sync_ground():
@@ -71,7 +123,8 @@ def sync_ground():
     urls = dict(zip(map(basename, urls), urls))
 
     # make sets of remote and mirror filenames
-    current = set(os.listdir(MIRROR_DIR))
+    with os.scandir(MIRROR_DIR) as entries:
+        current = {entry.name for entry in entries if entry.is_file()}
     remote = set(urls)
 
     # remove files from mirror that are no longer on the remote
@@ -81,23 +134,15 @@ def sync_ground():
         os.remove(join(MIRROR_DIR, filename))
 
     # download new remotes to mirror and copy-and-move to import
-    retrieve = remote - current
-    logger.info('Download %s file(s).' % len(retrieve))
-    suffix = '.copy'
-    for filename in retrieve:
-        download(
-            url=urls[filename],
-            path=join(MIRROR_DIR, filename),
-            auth=auth,
-        )
-        shutil.copy(
-            join(MIRROR_DIR, filename),
-            join(MIRROR_DIR, filename + suffix),
-        )
-        os.rename(
-            join(MIRROR_DIR, filename + suffix),
-            join(IMPORT_DIR, filename),
-        )
+    filenames = remote - current
+    logger.info('Download %s file(s).' % len(filenames))
+    with ThreadPoolExecutor(max_workers=WORKERS) as executor:
+        list(executor.map(
+            lambda filename: retrieve(
+                url=urls[filename], filename=filename, auth=auth,
+            ),
+            filenames,
+        ))
 
     logger.info('Done.')
 
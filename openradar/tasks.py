@@ -21,6 +21,15 @@ from openradar import utils
 app = celery.Celery()
 app.conf.broker_url = config.CELERY_BROKER_URL
 app.conf.task_time_limit = 600
+# long tasks: fetch one at a time and ack when done
+app.conf.worker_prefetch_multiplier = 1
+app.conf.task_acks_late = True
+# reuse broker connections for the cascade fan-outs
+app.conf.broker_pool_limit = 32
+app.conf.broker_transport_options = {
+    'socket_keepalive': True,
+    'socket_timeout': 10,
+}
 # app.conf.task_always_eager = True
 
 
@@ -28,6 +37,13 @@ def on_failure(self, exc, task_id, args, kwargs, einfo):
     logging.warn(einfo)
 
 
+def parse_datetime(value):
+    """ Return datetime, parsing value if it is a serialized one. """
+    if isinstance(value, str):
+        return ciso8601.parse_datetime(value)
+    return value
+
+
 @app.task
 def do_nothing():
     """ Empty task that can be used as the start of a chain. """
@@ -41,10 +57,7 @@ def aggregate(result, datetime, timeframe, nowcast,
     logging.info(20 * '-' + ' aggregate ' + 20 * '-')
 
     # parse datetime if necessary
-    try:
-        datetime = ciso8601.parse_datetime(datetime)
-    except TypeError:
-        pass
+    datetime = parse_datetime(datetime)
     
     # Create aggregates
     aggregate_kwargs = dict(
@@ -72,6 +85,7 @@ def aggregate(result, datetime, timeframe, nowcast,
         combinations = utils.get_product_combinations(
             datetimes=[datetime], timeframes=[timeframe],
         )
+        signatures = []
         for combination in combinations:
             calibrate_kwargs = dict(result=None,
                                     radars=radars,
@@ -82,7 +96,10 @@ def aggregate(result, datetime, timeframe, nowcast,
             if direct:
                 calibrate(**calibrate_kwargs)
             else:
-                calibrate.delay(**calibrate_kwargs)
+                signatures.append(calibrate.s(**calibrate_kwargs))
+        # enqueue the fan-out at once
+        if signatures:
+            celery.group(signatures).apply_async()
     
     logging.info(20 * '-' + ' aggregate complete ' + 20 * '-')
 
@@ -95,10 +112,7 @@ def calibrate(result, datetime, prodcode, timeframe, nowcast,
     logging.info(20 * '-' + ' calibrate ' + 20 * '-')
 
     # parse datetime if necessary
-    try:
-        datetime = ciso8601.parse_datetime(datetime)
-    except TypeError:
-        pass
+    datetime = parse_datetime(datetime)
 
     # Create products
     if nowcast:
@@ -119,6 +133,7 @@ def calibrate(result, datetime, prodcode, timeframe, nowcast,
             prodcodes=[prodcode],
             timeframes=[timeframe],
         )
+        signatures = []
         for combination in combinations:
             rescale_kwargs = dict(result=None,
                                   direct=direct,
@@ -130,7 +145,10 @@ def calibrate(result, datetime, prodcode, timeframe, nowcast,
             if direct:
                 rescale(**rescale_kwargs)
             else:
-                rescale.delay(**rescale_kwargs)
+                signatures.append(rescale.s(**rescale_kwargs))
+        # enqueue the fan-out at once
+        if signatures:
+            celery.group(signatures).apply_async()
 
     logging.info(20 * '-' + ' calibrate complete ' + 20 * '-')
 
@@ -143,10 +161,7 @@ def rescale(result, datetime, prodcode,
     logging.info(20 * '-' + ' rescale ' + 20 * '-')
 
     # parse datetime if necessary
-    try:
-        datetime = ciso8601.parse_datetime(datetime)
-    except TypeError:
-        pass
+    datetime = parse_datetime(datetime)
 
     product = products.CalibratedProduct(prodcode=prodcode,
                                          datetime=datetime,
@@ -172,10 +187,7 @@ def publish(result, datetimes, prodcodes, timeframes, endpoints, cascade,
     logging.info(20 * '-' + ' publish ' + 20 * '-')
 
     # parse datetimes if necessary
-    try:
-        datetimes = [ciso8601.parse_datetime(d) for d in datetimes]
-    except TypeError:
-        pass
+    datetimes = [parse_datetime(d) for d in datetimes]
 
     publisher = publishing.Publisher(datetimes=datetimes,
                                      prodcodes=prodcodes,
@@ -195,25 +207,13 @@ def nowcast(result, datetime, timeframe, minutes):
     logging.info(20 * '-' + ' nowcast ' + 20 * '-')
 
     # parse datetime if necessary
-    try:
-        datetime = ciso8601.parse_datetime(datetime)
-    except TypeError:
-        pass
+    datetime = parse_datetime(datetime)
 
     # the result product is called the nowcast product
     nowcast_product = products.NowcastProduct(
         datetime=datetime,
         timeframe=timeframe,
     )
-    # the vector products (realtime, five minutes)
-    # are used to determine the translation vector.
-    vector_products = []
-    for vector_delay in minutes + 15, minutes:
-        vector_products.append(products.CalibratedProduct(
-            prodcode='r',
-            timeframe='f',
-            datetime=datetime - timedelta(minutes=vector_delay),
-        ))
     # the base product is the product for which the data
     # is shifted to arrive at a nowcasted product.
     base_product = products.CalibratedProduct(
@@ -221,6 +221,17 @@ def nowcast(result, datetime, timeframe, minutes):
         timeframe='f',
         datetime=datetime - timedelta(minutes=minutes)
     )
+    # the vector products (realtime, five minutes)
+    # are used to determine the translation vector,
+    # the later one is the base product itself.
+    vector_products = [
+        products.CalibratedProduct(
+            prodcode='r',
+            timeframe='f',
+            datetime=base_product.datetime - timedelta(minutes=15),
+        ),
+        base_product,
+    ]
 
     nowcast_product.make(
         base_product=base_product,
@@ -241,10 +252,7 @@ def animate(result, datetime):
     logging.info(20 * '-' + ' animate ' + 20 * '-')
 
     # parse datetime if necessary
-    try:
-        datetime = ciso8601.parse_datetime(datetime)
-    except TypeError:
-        pass
+    datetime = parse_datetime(datetime)
 
     images.create_animated_gif(datetime=datetime)
     logging.info(20 * '-' + ' animate complete ' + 20 * '-')
@@ -0,0 +1,79 @@
+#!/usr/bin/
+# -*- coding: utf-8 -*-
+# (c) Nelen & Schuurmans.  GPL licensed, see LICENSE.rst.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from openradar import files
+
+
+class FakeResponse(object):
+    """ Just enough of a streamed requests response. """
+    def __init__(self, path, chunks, headers):
+        self.path = path
+        self.chunks = chunks
+        self.headers = headers
+        self.listings = []
+
+    def iter_content(self, chunk_size):
+        for chunk in self.chunks:
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield chunk
+            self.listings.append(sorted(os.listdir(self.path)))
+
+
+class TestFiles(unittest.TestCase):
+    """ Testing save_response """
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.target = os.path.join(self.path, 'volume.h5')
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def save(self, chunks, headers):
+        response = FakeResponse(
+            path=self.path, chunks=chunks, headers=headers,
+        )
+        result = files.save_response(response=response, path=self.target)
+        return result, response.listings
+
+    def test_save_response(self):
+        result, listings = self.save(
+            chunks=[b'abc', b'de'], headers={'Content-Length': '5'},
+        )
+        self.assertEqual(result, 5)
+        # only the part file exists while the body is streamed
+        self.assertEqual(listings, [['volume.h5.part']] * 2)
+        self.assertEqual(os.listdir(self.path), ['volume.h5'])
+        with open(self.target, 'rb') as f:
+            self.assertEqual(f.read(), b'abcde')
+
+    def test_save_response_short(self):
+        result, _ = self.save(
+            chunks=[b'abc'], headers={'Content-Length': '5'},
+        )
+        self.assertIsNone(result)
+        self.assertEqual(os.listdir(self.path), [])
+
+    def test_save_response_encoded(self):
+        # the decoded body is larger than the compressed Content-Length
+        result, _ = self.save(
+            chunks=[b'abc', b'def'],
+            headers={'Content-Length': '4', 'Content-Encoding': 'gzip'},
+        )
+        self.assertEqual(result, 6)
+        self.assertEqual(os.listdir(self.path), ['volume.h5'])
+
+    def test_save_response_interrupted(self):
+        with self.assertRaises(IOError):
+            self.save(
+                chunks=[b'abc', IOError('connection lost')],
+                headers={'Content-Length': '5'},
+            )
+        self.assertEqual(os.listdir(self.path), [])
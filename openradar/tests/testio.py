@@ -0,0 +1,98 @@
+#!/usr/bin/
+# -*- coding: utf-8 -*-
+# (c) Nelen & Schuurmans.  GPL licensed, see LICENSE.rst.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from openradar import io
+
+
+def unpack_dx_loop(raw):
+    """ Naive per-item zero unpacking, as in the original reader. """
+    beam = []
+    for item in raw:
+        if item & 4096:
+            beam.extend([0] * (item & 4095))
+        else:
+            beam.append(item)
+    return np.array(beam)
+
+
+def read_dx_loop(raw):
+    """ Per-beam decoding of raw words, as in the original reader. """
+    newazimuths = np.append(np.where(raw == 2 ** 13)[0], len(raw))
+    beams = np.array([unpack_dx_loop(raw[start + 3:end])
+                      for start, end in zip(newazimuths, newazimuths[1:])])
+    return (beams & 8191) * 0.5 - 32.5, (beams & 2 ** 15) != 0
+
+
+def make_beam(random, azimuth):
+    """ Return the words of a beam of 128 bins, with zero runs packed. """
+    words = [2 ** 13, azimuth, 5]
+    bins = 0
+    while bins < 128:
+        if random.rand() < 0.2:
+            run = min(random.randint(1, 20), 128 - bins)
+            words.append(4096 | run)
+            bins += run
+        else:
+            words.append(random.randint(1, 4096) | 2 ** 15 * random.randint(2))
+            bins += 1
+    return words
+
+
+class TestIO(unittest.TestCase):
+    """ Testing the DX decoder """
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_unpack_dx(self):
+        raw = np.array([7, 4096 | 3, 9, 4096 | 2], dtype='u2')
+        unpacked = io.unpack_dx(raw)
+        self.assertEqual(unpacked.tolist(), [7, 0, 0, 0, 9, 0, 0])
+        self.assertEqual(unpacked.dtype, raw.dtype)
+
+        raw = np.arange(1, 129, dtype='u2')
+        self.assertIs(io.unpack_dx(raw), raw)
+
+    def test_read_dx(self):
+        random = np.random.RandomState(0)
+        words = []
+        for azimuth in range(256):
+            words.extend(make_beam(random, azimuth * 14))
+        body = np.array(words, dtype='<u2').tobytes()
+
+        # let the doubled terminator straddle the first block read, so
+        # that the first 0x03 is not yet the end of the header
+        header = 'DX181210104531212BY{:05d}VS 2CO0CD2CS0EP{}MS'.format(
+            513 + len(body), 24 * '0',
+        )
+        message = (511 - len(header) - 3) * 'x'
+        header += '{:03d}{}\x03\x03'.format(len(message), message)
+        self.assertEqual(len(header), 513)
+
+        filename = os.path.join(
+            self.path, 'raa00-dx_10410-1812101045-dx---bin',
+        )
+        with open(filename, 'wb') as dx:
+            dx.write(header.encode('ascii') + body)
+
+        data, attrs = io.read_dx(filename)
+        expected_data, expected_clutter = read_dx_loop(
+            np.frombuffer(body, dtype='<u2'),
+        )
+        self.assertEqual(data.shape, (256, 128))
+        np.testing.assert_array_equal(data, expected_data)
+        np.testing.assert_array_equal(attrs['clutter'], expected_clutter)
+        np.testing.assert_array_equal(attrs['azim'], np.arange(256) * 14 / 10.)
+        self.assertEqual(attrs['message'], message)
+        self.assertEqual(attrs['bytes'], 513 + len(body))
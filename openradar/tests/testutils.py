@@ -5,6 +5,9 @@
 import unittest
 import datetime
 
+import numpy as np
+from PIL import Image
+
 from openradar import utils
 
 
@@ -94,3 +97,75 @@ class TestUtils(unittest.TestCase):
                                                   timeframe=timeframe),
                 expected,
             )
+
+    def test_get_valid_timeframes(self):
+        data = [
+            (datetime.datetime(2013, 2, 3, 4, 5), ['f']),
+            (datetime.datetime(2013, 2, 3, 4, 6), []),
+            (datetime.datetime(2013, 2, 3, 4, 5, 1), []),
+            (datetime.datetime(2013, 2, 3, 4, 5, 0, 1), []),
+        ]
+        for dt, expected in data:
+            self.assertEqual(utils.get_valid_timeframes(dt), expected)
+
+        # callers get their own list
+        utils.get_valid_timeframes(data[0][0]).append('h')
+        self.assertEqual(utils.get_valid_timeframes(data[0][0]), ['f'])
+
+    def test_get_chunks(self):
+        # a basegrid frame fits the default chunk cache
+        self.assertEqual(utils.get_chunks((490, 500), 'f4'), (490, 500))
+        self.assertEqual(utils.get_chunks((490, 500), 'u2'), (490, 500))
+        # larger frames are split into tiles that do fit
+        self.assertEqual(utils.get_chunks((1000, 1000), 'f4'), (500, 500))
+        self.assertEqual(utils.get_chunks((2000, 500), 'f8'), (250, 500))
+
+    def test_variabletimestamp2datetime(self):
+        # fast path agrees with strptime for every supported length
+        for ts in '20121218', '2012121809', '201212180905', '20121218090517':
+            fmt = '%Y%m%d%H%M%S'[:len(ts) - 2]
+            self.assertEqual(
+                utils.variabletimestamp2datetime(ts),
+                datetime.datetime.strptime(ts, fmt),
+            )
+        self.assertEqual(utils.timestamp2datetime('20121218090517'),
+                         datetime.datetime(2012, 12, 18, 9, 5, 17))
+        # non-ascii digits are rejected, as strptime does
+        with self.assertRaises(ValueError):
+            utils.variabletimestamp2datetime('\uff12\uff10\uff11\uff12'
+                                             '\uff11\uff12\uff11\uff18')
+
+    def test_closest_time(self):
+        dt = datetime.datetime(2012, 4, 13, 12, 27, 13, 5)
+        self.assertEqual(utils.closest_time('f', dt),
+                         datetime.datetime(2012, 4, 13, 12, 25))
+        self.assertEqual(utils.closest_time('h', dt),
+                         datetime.datetime(2012, 4, 13, 12))
+        self.assertEqual(utils.closest_time('d', dt),
+                         datetime.datetime(2012, 4, 13, 8))
+        # before eight the day product is still that of the day before
+        dt = datetime.datetime(2012, 4, 13, 7, 59)
+        self.assertEqual(utils.closest_time('d', dt),
+                         datetime.datetime(2012, 4, 12, 8))
+
+    def test_merge(self):
+        # merging equals pasting each next image below the result so far,
+        # including for partial alpha and more than two images
+        random = np.random.RandomState(0)
+        images = [
+            Image.fromarray(random.randint(0, 256, (7, 9, 4)).astype('u1'))
+            for i in range(5)
+        ]
+        expected = images[0]
+        for image in images[1:]:
+            pasted = image.copy()
+            array = np.array(expected)
+            pasted.paste(
+                Image.fromarray(array[:, :, :3]),
+                None,
+                Image.fromarray(array[:, :, 3]),
+            )
+            expected = pasted
+        np.testing.assert_array_equal(
+            np.array(utils.merge(images)), np.array(expected),
+        )
@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 # (c) Nelen & Schuurmans.  GPL licensed, see LICENSE.rst.
 
-from functools import reduce
+from functools import lru_cache
 
 import ciso8601
 import codecs
@@ -10,6 +10,7 @@ import h5py
 import logging
 import numpy as np
 import os
+import shutil
 
 from osgeo import osr
 from matplotlib import colors
@@ -35,13 +36,14 @@ RD = ("+proj=sterea +lat_0=52.15616055555555 +lon_0=5.38763888888889 "
 
 
 # Projections and transformations
+@lru_cache(maxsize=64)
 def projection_aeqd(lat=None, lon=None):
     sr = osr.SpatialReference()
     sr.ImportFromProj4(str(AEQD_PROJ4.format(lat=lat, lon=lon)))
     return sr.ExportToWkt()
 
 
-def projection(desc, export='wkt'):
+def _spatial_reference(desc):
     sr = osr.SpatialReference()
     if isinstance(desc, int):
         sr.ImportFromEPSG(desc)
@@ -50,48 +52,72 @@ def projection(desc, export='wkt'):
             sr.ImportFromProj4(str(desc))
         else:
             sr.ImportFromWkt(str(desc))
+    return sr
+
+
+@lru_cache(maxsize=64)
+def _export_projection(desc, export):
+    sr = _spatial_reference(desc)
     if export == 'wkt':
         return sr.ExportToWkt()
-    if export == 'proj4':
-        return sr.ExportToProj4()
-    return sr
+    return sr.ExportToProj4()
+
+
+def projection(desc, export='wkt'):
+    """
+    Return projection as wkt, proj4 or SpatialReference.
+
+    Exported strings are memoized, SpatialReference objects are mutable
+    and therefore created for every call.
+    """
+    if export in ('wkt', 'proj4'):
+        return _export_projection(desc, export)
+    return _spatial_reference(desc)
 
 
 def transform(point, desc):
-    srs = [projection(e, export=None) for e in desc]
-    ct = osr.CoordinateTransformation(*srs)
+    ct = coordinate_transformer.get_transformation(desc)
     return ct.TransformPoint(*point)[0:2]
 
 
 class CoordinateTransformer(object):
     """
-    Transform coordinates or give cached coordinates back.
+    Transform coordinates, caching the coordinate transformations.
 
-    TODO Make this a simple function, caching is not trivial here.
+    Caching the coordinates themselves is not trivial, so they are not.
     """
 
     def __init__(self):
         self.cache = {}
 
+    def get_transformation(self, projections):
+        """ Return coordinate transformation, creating it if necessary. """
+        key = tuple(projections)
+        try:
+            return self.cache[key]
+        except KeyError:
+            pass
+        ct = osr.CoordinateTransformation(
+            projection(projections[0], export=None),
+            projection(projections[1], export=None),
+        )
+        self.cache[key] = ct
+        return ct
+
     def transform(self, points, projections):
         """
         Transform arrays of points from one projection to another.
         """
-        shape = np.array([p.shape for p in points]).max(0)
+        # column_stack below requires points of equal shape
+        height, width = points[0].shape
 
-        points_in = np.array([
-            points[0].flatten(),
-            points[1].flatten(),
-        ]).transpose()
+        points_in = np.column_stack([points[0].ravel(), points[1].ravel()])
 
-        ct = osr.CoordinateTransformation(
-            projection(projections[0], export=None),
-            projection(projections[1], export=None),
-        )
+        ct = self.get_transformation(projections)
 
         points_out = np.array(ct.TransformPoints(points_in))[:, 0:2]
 
-        result = points_out.reshape(shape[0], shape[1], 2).transpose(2, 0, 1)
+        result = points_out.reshape(height, width, 2).transpose(2, 0, 1)
         return result
 
 
@@ -108,12 +134,37 @@ def datetime_range(start, stop, step):
         datetime += step
 
 
+ASCII_DIGITS = frozenset('0123456789')
+
+
+def _digits2datetime(ts):
+    """
+    Return datetime for an all-digit timestamp of 8 to 14 characters.
+
+    Slicing is much faster than strptime for the default format. Returns
+    None for anything else, so that callers can fall back to strptime.
+    """
+    # str.isdigit() also accepts non-ascii digits, strptime does not
+    if len(ts) not in (8, 10, 12, 14) or not ASCII_DIGITS.issuperset(ts):
+        return
+    fields = [ts[:4]] + [ts[i:i + 2] for i in range(4, len(ts), 2)]
+    return datetime.datetime(*map(int, fields))
+
+
 def variabletimestamp2datetime(ts, fmt='%Y%m%d%H%M%S'):
     """ Trying to match and increasingly detailed timestamp. """
+    if fmt == '%Y%m%d%H%M%S':
+        result = _digits2datetime(ts)
+        if result is not None:
+            return result
     return datetime.datetime.strptime(ts, fmt[:len(ts) - 2])
 
 
 def timestamp2datetime(ts, fmt='%Y%m%d%H%M%S'):
+    if fmt == '%Y%m%d%H%M%S' and len(ts) == 14:
+        result = _digits2datetime(ts)
+        if result is not None:
+            return result
     return datetime.datetime.strptime(ts, fmt)
 
 
@@ -196,37 +247,38 @@ class PathHelper(object):
         """
         Filetemplate must be something like '{code}_{timestamp}.'
         """
-        self._basedir = os.path.join(basedir, code)
         self._code = code
         self._template = template
+        # date directories in one strftime format, escaping the basedir
+        self._dirformat = os.path.join(
+            os.path.join(basedir, code).replace('%', '%%'), '%Y', '%m', '%d',
+        )
 
-    def path(self, dt):
-        return os.path.join(
-            self._basedir,
-            dt.strftime('%Y'),
-            dt.strftime('%m'),
-            dt.strftime('%d'),
-            self._template.format(
-                code=self._code,
-                timestamp=dt.strftime(self.TIMESTAMP_FORMAT)
-            )
+    def _filename(self, dt):
+        return self._template.format(
+            code=self._code,
+            timestamp=dt.strftime(self.TIMESTAMP_FORMAT),
         )
 
+    def path(self, dt):
+        return os.path.join(dt.strftime(self._dirformat), self._filename(dt))
+
     def path_with_hour(self, dt):
         return os.path.join(
-            self._basedir,
-            dt.strftime('%Y'),
-            dt.strftime('%m'),
-            dt.strftime('%d'),
-            dt.strftime('%H'),
-            self._template.format(
-                code=self._code,
-                timestamp=dt.strftime(self.TIMESTAMP_FORMAT)
-            )
+            dt.strftime(os.path.join(self._dirformat, '%H')),
+            self._filename(dt),
         )
 
 
 # Timing
+# step and hour of day to round down to, per timeframe
+CLOSEST_TIME_STEPS = {
+    'f': (datetime.timedelta(minutes=5), 0),
+    'h': (datetime.timedelta(hours=1), 0),
+    'd': (datetime.timedelta(days=1), 8),
+}
+
+
 def closest_time(timeframe='f', dt_close=None):
     '''
     Get corresponding datetime based on the timeframe.
@@ -239,30 +291,31 @@ def closest_time(timeframe='f', dt_close=None):
         now = dt_close
     else:
         now = datetime.datetime.utcnow()
-    if timeframe == 'h':
-        closesttime = now.replace(minute=0, second=0, microsecond=0)
-    elif timeframe == 'd':
-        closesttime = now.replace(hour=8, minute=0, second=0, microsecond=0)
-        if closesttime > now:
-            closesttime = closesttime - datetime.timedelta(days=1)
-    else:
-        closesttime = now.replace(
-            minute=now.minute - (now.minute % 5), second=0, microsecond=0,
-        )
-    return closesttime
+    step, hour = CLOSEST_TIME_STEPS.get(timeframe, CLOSEST_TIME_STEPS['f'])
+    # round down the wall clock time, like replace() would
+    origin = datetime.datetime(1970, 1, 1, hour)
+    return now - (now.replace(tzinfo=None) - origin) % step
 
 
-def get_valid_timeframes(datetime):
-    """ Return a list of timeframe codes corresponding to a datetime."""
+@lru_cache(maxsize=2048)
+def _valid_timeframes(hour, minute, second, microsecond):
+    """ Return a tuple of timeframe codes corresponding to a time of day. """
     result = []
-    if datetime.second == 0 and datetime.microsecond == 0:
-        if datetime.minute == (datetime.minute // 5) * 5:
+    if second == 0 and microsecond == 0:
+        if minute == (minute // 5) * 5:
             result.append('f')
-        # if datetime.minute == 0:
+        # if minute == 0:
             # result.append('h')
-            # if datetime.hour == 8:
+            # if hour == 8:
                 # result.append('d')
-    return result
+    return tuple(result)
+
+
+def get_valid_timeframes(datetime):
+    """ Return a list of timeframe codes corresponding to a datetime."""
+    return list(_valid_timeframes(
+        datetime.hour, datetime.minute, datetime.second, datetime.microsecond,
+    ))
 
 
 def get_aggregate_combinations(datetimes,
@@ -270,15 +323,14 @@ def get_aggregate_combinations(datetimes,
     """ Return generator of dictionaries. """
     for _datetime in datetimes:
         valid_timeframes = get_valid_timeframes(datetime=_datetime)
-        for timeframe in timeframes:
-            if timeframe in valid_timeframes:
-                yield dict(nowcast=False,
+        for timeframe in [t for t in timeframes if t in valid_timeframes]:
+            yield dict(nowcast=False,
+                       datetime=_datetime,
+                       timeframe=timeframe)
+            if timeframe == 'f':
+                yield dict(nowcast=True,
                            datetime=_datetime,
                            timeframe=timeframe)
-                if timeframe == 'f':
-                    yield dict(nowcast=True,
-                               datetime=_datetime,
-                               timeframe=timeframe)
 
 
 def get_product_combinations(datetimes,
@@ -287,18 +339,20 @@ def get_product_combinations(datetimes,
     """ Return generator of dictionaries. """
     for _datetime in datetimes:
         valid_timeframes = get_valid_timeframes(datetime=_datetime)
+        timeframes_here = [t for t in timeframes if t in valid_timeframes]
+        if not timeframes_here:
+            continue
         for prodcode in prodcodes:
-            for timeframe in timeframes:
-                if timeframe in valid_timeframes:
-                    yield dict(nowcast=False,
+            for timeframe in timeframes_here:
+                yield dict(nowcast=False,
+                           datetime=_datetime,
+                           prodcode=prodcode,
+                           timeframe=timeframe)
+                if timeframe == 'f' and prodcode == 'r':
+                    yield dict(nowcast=True,
                                datetime=_datetime,
                                prodcode=prodcode,
                                timeframe=timeframe)
-                    if timeframe == 'f' and prodcode == 'r':
-                        yield dict(nowcast=True,
-                                   datetime=_datetime,
-                                   prodcode=prodcode,
-                                   timeframe=timeframe)
 
 
 def consistent_product_expected(prodcode, timeframe):
@@ -351,6 +405,19 @@ def get_groundfile_datetimes(prodcode, timeframe, date):
 # Visualization
 def rain_kwargs(max_rain=120, name='buienradar', threshold=0.1):
     """ Return colormap and normalizer suitable for rain. """
+    kwargs = _rain_kwargs(max_rain=max_rain, name=name, threshold=threshold)
+    if kwargs is not None:
+        return dict(kwargs)
+
+
+@lru_cache(maxsize=8)
+def _rain_kwargs(max_rain, name, threshold):
+    """
+    Memoized, because the colormaps are rebuilt for every image otherwise.
+
+    Callers get a copy of the dict, the colormaps and normalizers are
+    not modified after creation.
+    """
     if name == 'buienradar':
         rain_colors = {
             'red': (
@@ -396,11 +463,12 @@ def rain_kwargs(max_rain=120, name='buienradar', threshold=0.1):
 
     if name == 'jet':
         colormap = cm.jet
+        log_norm = colors.LogNorm(vmin=threshold, vmax=max_rain)
 
         def normalize(data):
             ma = np.ma.array(data)
             ma[np.less(ma, threshold)] = np.ma.masked
-            return colors.LogNorm(vmin=threshold, vmax=max_rain)(ma)
+            return log_norm(ma)
 
         return dict(colormap=colormap, normalize=normalize)
 
@@ -411,16 +479,26 @@ def merge(images):
 
     Merge a list of pil images with equal sizes top down based on
     the alpha channel.
-    """
-
-    def paste(image1, image2):
-        image = image2.copy()
-        mask = Image.fromarray(np.array(image1)[:, :, 3])
-        rgb = Image.fromarray(np.array(image1)[:, :, 0:3])
-        image.paste(rgb, None, mask)
-        return image
 
-    return reduce(paste, images)
+    Each next image goes below the result so far, blended with the alpha
+    of the result as mask using the integer arithmetic of PIL's paste, so
+    that the outcome equals pasting the images one by one. The blending
+    is done on a single integer buffer.
+    """
+    images = iter(images)
+    result = np.array(next(images), dtype='i4')
+    for image in images:
+        below = np.array(image, dtype='i4')
+        mask = result[:, :, 3:].copy()
+        result[:, :, 3] = 255  # paste converts the rgb to opaque rgba
+        # (result * mask + below * (255 - mask)) / 255, rounded like paste
+        result *= mask
+        below *= 255 - mask
+        result += below
+        result += 128
+        result += result >> 8
+        result >>= 8
+    return Image.fromarray(result.astype('u1'))
 
 
 def makedir(dirname):
@@ -432,6 +510,42 @@ def makedir(dirname):
         return False
 
 
+def _kernel_copy(source, target, count):
+    """ Return number of bytes copied from source to target fd. """
+    if hasattr(os, 'copy_file_range'):  # python >= 3.8
+        return os.copy_file_range(source, target, count)
+    return os.sendfile(target, source, None, count)
+
+
+def copy_file(source_path, target_path):
+    """
+    Copy file data and permission bits, like shutil.copy does.
+
+    Uses os.copy_file_range where available, so the data is copied within
+    the kernel, or within the filesystem if it supports that, and
+    os.sendfile otherwise. Falls back to shutil.copy if neither works.
+    """
+    if not hasattr(os, 'sendfile'):
+        shutil.copy(source_path, target_path)
+        return
+
+    try:
+        with open(source_path, 'rb') as source:
+            with open(target_path, 'wb') as target:
+                remaining = os.fstat(source.fileno()).st_size
+                while remaining > 0:
+                    copied = _kernel_copy(
+                        source.fileno(), target.fileno(), remaining,
+                    )
+                    if not copied:
+                        break
+                    remaining -= copied
+    except OSError:  # e.g. not supported by kernel or filesystem
+        shutil.copy(source_path, target_path)
+        return
+    shutil.copymode(source_path, target_path)
+
+
 class UTF8Recoder:
     """
     Iterator that reads an encoded stream and reencodes the input to UTF-8
@@ -457,6 +571,22 @@ def save_attrs(h5, attrs):
         h5.attrs[key] = np.array([value])
 
 
+def get_chunks(shape, dtype, size=2 ** 20):
+    """
+    Return chunk shape for a dataset of shape and dtype.
+
+    Readers fetch whole frames, so a frame that fits in size bytes (the
+    default hdf5 chunk cache) is a single chunk. Larger frames have their
+    largest dimension halved until the tiles fit.
+    """
+    itemsize = np.dtype(dtype).itemsize
+    chunks = list(shape)
+    while np.prod(chunks) * itemsize > size and max(chunks) > 1:
+        index = chunks.index(max(chunks))
+        chunks[index] = (chunks[index] + 1) // 2
+    return tuple(chunks)
+
+
 def save_dataset(data, meta, path):
     '''
     Accepts an array jampacked with data, a metadata file and a path
@@ -491,10 +621,10 @@ def save_dataset(data, meta, path):
     )
 
     # Overview group
-    availables = meta['available']
-    try:
-        availables_any = [any(r) for r in zip(*availables)]
-    except TypeError:
+    availables = np.asarray(meta['available'], dtype=bool)
+    if availables.ndim == 2:
+        availables_any = availables.any(axis=0)
+    else:
         availables_any = availables
     products_missing = str(', '.join(
         [radar
@@ -544,9 +674,11 @@ def save_dataset(data, meta, path):
     )
 
     save_attrs(h5, groups)
-    dataset = h5.create_dataset('image1/image_data',
-                                data['precipitation'].shape,
-                                dtype='u2', compression='gzip', shuffle=True)
+    shape = data['precipitation'].shape
+    dataset = h5.create_dataset('image1/image_data', shape,
+                                chunks=get_chunks(shape, 'u2'),
+                                dtype='u2', shuffle=True,
+                                compression=config.HDF5_COMPRESSION)
 
     image_data = dict(
         CLASS=b'IMAGE',
@@ -555,15 +687,22 @@ def save_dataset(data, meta, path):
 
     save_attrs(dataset, image_data)
 
-    # Creating the pixel values
-    dataset[...] = np.uint16(np.round(data['precipitation'] * 100)).filled(
-        calibration['calibration_out_of_image'],
+    # Creating the pixel values, scaling in a single float buffer
+    precipitation = data['precipitation']
+    scaled = np.multiply(np.ma.getdata(precipitation), 100)
+    np.rint(scaled, out=scaled)
+    pixels = scaled.astype('u2')
+    pixels[np.ma.getmaskarray(precipitation)] = (
+        calibration['calibration_out_of_image']
     )
+    dataset[...] = pixels
 
     # Keep the old way for compatibility with various products
     for name, value in data.items():
-        dataset = h5.create_dataset(name, value.shape, dtype='f4',
-                                    compression='gzip', shuffle=True)
+        dataset = h5.create_dataset(name, value.shape,
+                                    chunks=get_chunks(value.shape, 'f4'),
+                                    dtype='f4', shuffle=True,
+                                    compression=config.HDF5_COMPRESSION)
         dataset[...] = value.filled(config.NODATAVALUE)
 
     for name, value in meta.items():
@@ -14,6 +14,7 @@ install_requires = [
     'ciso8601',
     'gdal',
     'h5py==2.6.0',
+    'hiredis',
     'matplotlib',
     'numpy',
     'pandas',